@@ -1,84 +1,213 @@
-import math
+import functools
 import os
-import stat
 import time
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
 
 from .archive_path import ArchivePath
+from .file_entry import FileEntry
+from .scan_cache import ScanCache
+
+# Scanning is I/O bound, so allow more workers than there are CPUs.
+_MAX_SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# With only a few root entries, starting a thread pool costs more than it saves.
+_MIN_PARALLEL_ENTRIES = 5
+
+NS_PER_DAY = 86400 * 10 ** 9
+
+# os.fwalk is only available on platforms supporting dir_fd (e.g. not Windows).
+_SUPPORTS_FWALK = hasattr(os, "fwalk") and os.stat in os.supports_dir_fd
+
+# A root's (latest atime_ns, total size, [(path, atime_ns, size)], used the cache).
+_ScanResult = Tuple[Optional[int], Optional[int], List[Tuple[str, int, int]], bool]
+
+# A directory's (path prefix, [(name, atime_ns, size)], came from the cache).
+_Listing = Tuple[str, List[Tuple[str, int, int]], bool]
+
+# The result for a root that wasn't scanned.
+_UNSCANNED: _ScanResult = (None, None, [], False)
 
 
 def analyze_directory(
-    root_path: str, ignore_paths: List[str], threshold_days: int = 1
-) -> Dict[str, ArchivePath]:
-    # Shortlist paths to archive.
-    paths = {}
+    root_path: str,
+    ignore_paths: Iterable[str],
+    threshold_days: int = 1,
+    cache: Optional[ScanCache] = None,
+) -> Tuple[List[ArchivePath], List[FileEntry]]:
+    # Shortlist root paths, and the files under them to archive.
+    roots = []
+    archive_files = []
+    now_ns = time.time_ns()
+    ignored_names = frozenset(ignore_paths)
+
+    # Any file accessed after this means its root can't be archived.
+    cutoff_ns = now_ns - threshold_days * NS_PER_DAY if threshold_days > 0 else None
 
     # Scan within this directory.
-    for partial_path in os.listdir(root_path):
-
-        key = os.path.join(root_path, partial_path)
-        days_since_last_access = _days_stale(key)
-        should_ignore = partial_path in ignore_paths
+    with os.scandir(root_path) as it:
+        entries = [(entry, entry.is_dir(follow_symlinks=False)) for entry in it]
+
+    # Ignored roots can never be archived, so don't walk them at all (their size
+    # and idle time are shown as unknown).
+    scans = [_UNSCANNED] * len(entries)
+    to_scan = [i for i, (entry, _) in enumerate(entries) if entry.name not in ignored_names]
+    for i, scan in zip(to_scan, _scan_roots([entries[i] for i in to_scan], cache, cutoff_ns)):
+        scans[i] = scan
+
+    # Reading a file updates its access time but not its directory's mtime, so a
+    # cached access time can be older than the real one. That means a cached scan
+    # can prove a root was used recently, but never that it's safe to archive:
+    # a root which looks archivable from cached listings is re-scanned from disk.
+    if cache is not None:
+        recheck = [
+            i
+            for i, ((entry, _), (access_time_ns, _, _, used_cache))
+            in enumerate(zip(entries, scans))
+            if used_cache
+            and _days_since(access_time_ns, now_ns) >= threshold_days
+        ]
+        rescans = _scan_roots([entries[i] for i in recheck], cache.refreshing(), cutoff_ns)
+        for i, rescan in zip(recheck, rescans):
+            scans[i] = rescan
+
+    for (entry, is_dir), (access_time_ns, size, files, _) in zip(entries, scans):
+
+        key = entry.path
+        days_since_last_access = _days_since(access_time_ns, now_ns)
+        should_ignore = entry.name in ignored_names
         should_archive = days_since_last_access >= threshold_days and not should_ignore
 
-        # Add this root directory.
-        paths[key] = ArchivePath(
+        # Add this root path.
+        roots.append(ArchivePath(
             key,
             days_since_last_access,
             should_archive=should_archive,
             is_root=True,
-            is_dir=os.path.isdir(key),
+            is_dir=is_dir,
             is_ignored=should_ignore,
-        )
+            size=size,
+        ))
 
-        # Add sub paths.
+        # Add the files to archive (just the root itself, if it's a file).
         if should_archive:
-            for file in _all_files_in_dir(key):
-                paths[file] = ArchivePath(
-                    file,
-                    days_since_last_access,
-                    should_archive=True,
-                    is_root=False,
-                    is_dir=False,
-                    is_ignored=False,
-                )
-
-    return paths
-
-
-def _days_stale(path: str):
-    if os.path.isfile(path):
-        return _days_stale_of_file(path)
-    else:
-        return _days_stale_of_directory(path)
-
-
-def _all_files_in_dir(path: str):
+            archive_files.extend(
+                FileEntry(file_path, file_access_time_ns)
+                for file_path, file_access_time_ns, _ in files
+            )
+
+    return roots, archive_files
+
+
+def _days_since(access_time_ns: Optional[int], now_ns: int) -> int:
+    # An empty directory counts as just accessed.
+    if access_time_ns is None:
+        return 0
+    return (now_ns - access_time_ns) // NS_PER_DAY
+
+
+def _scan_roots(
+    entries: List[Tuple[os.DirEntry, bool]],
+    cache: Optional[ScanCache],
+    cutoff_ns: Optional[int],
+) -> List[_ScanResult]:
+    # Each root subtree is scanned independently, and the work is dominated by
+    # scandir/stat calls (which release the GIL), so scan them on a thread pool.
+    scan_subtree = functools.partial(_scan_subtree, cache=cache, cutoff_ns=cutoff_ns)
+    if len(entries) < _MIN_PARALLEL_ENTRIES:
+        return [scan_subtree(entry, is_dir) for entry, is_dir in entries]
+
+    max_workers = min(len(entries), _MAX_SCAN_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(scan_subtree, *zip(*entries)))
+
+
+def _scan_subtree(
+    entry: os.DirEntry, is_dir: bool, cache: Optional[ScanCache], cutoff_ns: Optional[int]
+) -> _ScanResult:
+    # Walk this entry once, returning the latest access time (ns) of any file in it,
+    # its total size, every file found (with access time and size), and whether any
+    # of that came from the cache.
+    # If a file was accessed after the cutoff, the entry can't be archived, so
+    # stop early; the size is then unknown (None) and no files are returned.
+    if not is_dir:
+        file_stat = entry.stat(follow_symlinks=False)
+        access_time_ns, file_size = file_stat.st_atime_ns, file_stat.st_size
+        return access_time_ns, file_size, [(entry.path, access_time_ns, file_size)], False
+
+    latest_access_time_ns = None
+    total_size = 0
     files = []
-    for r, _, f in os.walk(path):
-        for file in f:
-            sub_path = os.path.join(r, file)
-            files.append(sub_path)
-    return files
-
-
-def _days_stale_of_file(file_path: str):
-    file_stats_result = os.stat(file_path)
-    access_time = file_stats_result[stat.ST_ATIME]
-    access_delta_seconds = time.time() - access_time
-    days_stale = _seconds_to_days(access_delta_seconds)
-    return days_stale
-
-
-def _days_stale_of_directory(directory_path: str):
-    latest_days = None
-    for file in _all_files_in_dir(directory_path):
-        days = _days_stale_of_file(file)
-        if latest_days is None or days < latest_days:
-            latest_days = days
-
-    return latest_days if latest_days is not None else 0
+    used_cache = False
+    for prefix, dir_files, from_cache in _listings_in_dir(entry.path, cache):
+        used_cache = used_cache or from_cache
+        for name, access_time_ns, file_size in dir_files:
+            if cutoff_ns is not None and access_time_ns > cutoff_ns:
+                return access_time_ns, None, [], used_cache
+            total_size += file_size
+            files.append((prefix + name, access_time_ns, file_size))
+            if latest_access_time_ns is None or access_time_ns > latest_access_time_ns:
+                latest_access_time_ns = access_time_ns
+
+    return latest_access_time_ns, total_size, files, used_cache
+
+
+def _listings_in_dir(path: str, cache: Optional[ScanCache]) -> Iterator[_Listing]:
+    # Yield the listing of every directory under (and including) this one.
+    if _SUPPORTS_FWALK:
+        # Stat each file relative to its directory's fd, rather than re-resolving
+        # the full path every time.
+        for walk_root, _, walk_files, walk_fd in os.fwalk(path):
+            mtime_ns = os.fstat(walk_fd).st_mtime_ns if cache is not None else None
+            yield _listing(
+                walk_root, mtime_ns, walk_files, cache,
+                lambda name: os.stat(name, dir_fd=walk_fd, follow_symlinks=False)
+            )
+        return
+
+    stack = [path]
+    while stack:
+        dir_path = stack.pop()
+        mtime_ns = os.stat(dir_path).st_mtime_ns if cache is not None else None
+        with os.scandir(dir_path) as it:
+            file_entries = {}
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_symlink() and entry.is_dir():
+                    # Like fwalk (and os.walk), treat links to directories as
+                    # directories, but don't follow them.
+                    continue
+                else:
+                    file_entries[entry.name] = entry
+        yield _listing(
+            dir_path, mtime_ns, list(file_entries), cache,
+            lambda name: file_entries[name].stat(follow_symlinks=False)
+        )
 
 
-def _seconds_to_days(seconds: float):
-    return math.floor(seconds / 86400)
+def _listing(
+    dir_path: str,
+    mtime_ns: Optional[int],
+    names: List[str],
+    cache: Optional[ScanCache],
+    stat_file: Callable[[str], os.stat_result],
+) -> _Listing:
+    # Returns the path prefix for the files in this directory, their
+    # (name, atime_ns, size), and whether those came from the cache.
+    # Paths are joined by concatenating onto one prefix per directory (as os.walk does).
+    prefix = dir_path if dir_path.endswith(os.sep) else dir_path + os.sep
+
+    # An unchanged directory (same mtime) still has the same files, so reuse
+    # their cached stats; otherwise stat them and refresh the cache.
+    cached_files = cache.lookup(dir_path, mtime_ns) if cache is not None else None
+    if cached_files is not None:
+        return prefix, cached_files, True
+
+    dir_files = []
+    for name in names:
+        file_stat = stat_file(name)
+        dir_files.append((name, file_stat.st_atime_ns, file_stat.st_size))
+    if cache is not None:
+        cache.store(dir_path, mtime_ns, dir_files)
+    return prefix, dir_files, False
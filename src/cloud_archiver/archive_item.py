@@ -1,4 +1,6 @@
 class ArchiveItem:
+    __slots__ = ("key", "path")
+
     def __init__(self, key: str, path: str):
         self.key: str = key
         self.path: str = path
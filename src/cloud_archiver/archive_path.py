@@ -1,12 +1,19 @@
+from typing import Optional
+
+
 class ArchivePath:
+    __slots__ = ("key", "days_since_access", "is_root", "is_dir", "ignored",
+                 "should_archive", "size")
+
     def __init__(self, path: str, days_since_access: int, should_archive: bool,
-                 is_root: bool, is_dir: bool, is_ignored: bool):
+                 is_root: bool, is_dir: bool, is_ignored: bool, size: Optional[int] = 0):
         self.key: str = path
         self.days_since_access: int = days_since_access
         self.is_root: bool = is_root
         self.is_dir: bool = is_dir
         self.ignored: bool = is_ignored
         self.should_archive: bool = not self.ignored and should_archive
+        self.size: Optional[int] = size
 
     def __repr__(self):
         return f"[ArchivePath: {self.key} " \
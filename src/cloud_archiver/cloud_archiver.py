@@ -1,18 +1,22 @@
 import argparse
+import functools
 import os
-from typing import List, Dict
+from typing import List
 
 import boto3
+from botocore.config import Config
 
+from .delete_archive_items import delete_archive_items
 from .display_archive_items import display_archive_items
 from .file_generator import generate_test_set
 from .archive_item import ArchiveItem
-from .archive_path import ArchivePath
+from .file_entry import FileEntry
 from .get_items_in_archive import get_items_in_archive
 from .analyze_directory import analyze_directory
 from .transfer_to_archive import transfer_to_archive
-from .upload_archive import upload
+from .upload_archive import TRANSFER_CONFIG, upload
 from .load_config import load_config
+from .scan_cache import load_scan_cache, save_scan_cache
 from .display_paths import display_paths
 from rich.console import Console
 from rich.padding import Padding
@@ -20,6 +24,7 @@ from rich.prompt import Confirm
 
 ARCHIVE_FOLDER = ".archive"
 CONFIG_FILE = ".archive_config.json"
+CACHE_FILE = ".archive_cache.json"
 CONSOLE = Console()
 
 
@@ -54,23 +59,23 @@ def archive_app():
         f"This is the current configuration for px-archiver at this directory {os.getcwd()}. "
         f"You can edit this configuration at {CONFIG_FILE}.",
     )
-    bucket, days = load_config(CONFIG_FILE)
+    bucket, days, concurrency = load_config(CONFIG_FILE)
 
     # Analyze which files to archive.
-    archive_paths = archiver_analyze(root_path, days)
+    archive_files = archiver_analyze(root_path, days)
 
     # File transfer.
-    archiver_transfer(root_path, archive_paths)
+    archiver_transfer(root_path, archive_files)
 
     # Get items still in archive.
     archived_items = get_items_in_archive(root_path, ARCHIVE_FOLDER)
 
     # File upload.
-    upload_success = archiver_upload(bucket, archived_items)
+    upload_success = archiver_upload(bucket, archived_items, concurrency)
 
     # File deletion.
     if upload_success:
-        archiver_clean(archived_items)
+        archiver_clean(root_path, archived_items)
 
 
 def generate_test_files():
@@ -82,20 +87,22 @@ def configure():
     load_config(CONFIG_FILE)
 
 
-def archiver_analyze(root_path: str, days: int) -> Dict[str, ArchivePath]:
+def archiver_analyze(root_path: str, days: int) -> List[FileEntry]:
     _console_section(
         "Directory Analysis",
         f"Scanning for files and folders in this directory which haven't been accessed for over {days} days.",
     )
-    archive_paths = analyze_directory(root_path, [ARCHIVE_FOLDER, CONFIG_FILE], days)
-    display_paths(root_path, archive_paths)
-    return archive_paths
+    cache = load_scan_cache(CACHE_FILE)
+    root_paths, archive_files = analyze_directory(
+        root_path, [ARCHIVE_FOLDER, CONFIG_FILE, CACHE_FILE], days, cache=cache
+    )
+    save_scan_cache(CACHE_FILE, cache)
+    display_paths(root_path, root_paths)
+    return archive_files
 
 
-def archiver_transfer(root_path: str, archive_paths: Dict[str, ArchivePath]):
-    n_archive_files = sum(
-        [1 for x in archive_paths.values() if x.should_archive and not x.is_dir]
-    )
+def archiver_transfer(root_path: str, archive_files: List[FileEntry]):
+    n_archive_files = len(archive_files)
     if n_archive_files == 0:
         _console_print("No new files require archiving.")
     else:
@@ -104,12 +111,12 @@ def archiver_transfer(root_path: str, archive_paths: Dict[str, ArchivePath]):
             f"files to archive ({os.path.abspath(ARCHIVE_FOLDER)})?"
         )
         if should_archive:
-            transfer_to_archive(archive_paths, root_path, ARCHIVE_FOLDER)
+            transfer_to_archive(archive_files, root_path, ARCHIVE_FOLDER)
         else:
             _console_print("No files moved.")
 
 
-def archiver_upload(bucket: str, archived_items: List[ArchiveItem]) -> bool:
+def archiver_upload(bucket: str, archived_items: List[ArchiveItem], concurrency: int) -> bool:
     _console_section("Uploading")
     upload_success = False
     if len(archived_items) == 0:
@@ -128,13 +135,13 @@ def archiver_upload(bucket: str, archived_items: List[ArchiveItem]) -> bool:
             )
             upload_success = True
         else:
-            client = boto3.client("s3")
-            upload_success = upload(client, bucket, archived_items)
+            client = _get_s3_client(concurrency)
+            upload_success = upload(client, bucket, archived_items, max_workers=concurrency)
 
     return upload_success
 
 
-def archiver_clean(archived_items: List[ArchiveItem]):
+def archiver_clean(root_path: str, archived_items: List[ArchiveItem]):
     _console_section("Deletion")
     if len(archived_items) > 0:
         display_archive_items(archived_items, estimate_cost=False)
@@ -143,15 +150,24 @@ def archiver_clean(archived_items: List[ArchiveItem]):
             f"Do you want to [red]permanently delete[/red] these {len(archived_items)} files locally?"
         )
         if should_delete:
-            for item in archived_items:
-                os.remove(item.path)
-            _console_print(f"{len(archived_items)} files deleted from local archive.")
+            n_deleted = delete_archive_items(
+                archived_items, os.path.join(root_path, ARCHIVE_FOLDER)
+            )
+            _console_print(f"{n_deleted} files deleted from local archive.")
         else:
             _console_print(f"No files deleted.")
     else:
         _console_print(f"No files to be deleted.")
 
 
+@functools.lru_cache(maxsize=1)
+def _get_s3_client(concurrency: int):
+    # Every upload worker can have several parts in flight at once, so give the
+    # client enough connections for all of them (the default pool only has 10).
+    max_pool_connections = concurrency * TRANSFER_CONFIG.max_concurrency
+    return boto3.client("s3", config=Config(max_pool_connections=max_pool_connections))
+
+
 def _console_section(title: str, description: str = None):
     CONSOLE.rule(f"[bold]{title}")
     if description is not None:
@@ -0,0 +1,48 @@
+import os
+from collections import defaultdict
+from typing import Dict, List
+
+from .archive_item import ArchiveItem
+
+# Unlinking relative to a directory fd isn't supported everywhere (e.g. Windows).
+_SUPPORTS_DIR_FD = os.unlink in os.supports_dir_fd and hasattr(os, "O_DIRECTORY")
+
+
+def delete_archive_items(items: List[ArchiveItem], archive_path: str) -> int:
+
+    # Group the files by directory, so each directory is only resolved once.
+    names_by_dir: Dict[str, List[str]] = defaultdict(list)
+    for item in items:
+        dir_path, name = os.path.split(item.path)
+        names_by_dir[dir_path].append(name)
+
+    n = 0
+    unlink = os.unlink
+    for dir_path, names in names_by_dir.items():
+        if _SUPPORTS_DIR_FD:
+            dir_fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                for name in names:
+                    unlink(name, dir_fd=dir_fd)
+                    n += 1
+            finally:
+                os.close(dir_fd)
+        else:
+            for name in names:
+                unlink(os.path.join(dir_path, name))
+                n += 1
+
+    _remove_empty_dirs(list(names_by_dir), archive_path)
+    return n
+
+
+def _remove_empty_dirs(dir_paths: List[str], archive_path: str):
+    # Remove directories left empty inside the archive (but keep the archive itself).
+    archive_path = os.path.normpath(archive_path)
+    for dir_path in sorted((os.path.normpath(x) for x in dir_paths), key=len, reverse=True):
+        while dir_path != archive_path and dir_path.startswith(archive_path + os.sep):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                break
+            dir_path = os.path.dirname(dir_path)
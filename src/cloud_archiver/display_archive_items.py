@@ -1,5 +1,5 @@
 import os
-from pathlib import Path
+import stat
 from typing import List
 
 from rich import box
@@ -10,6 +10,7 @@ from rich.console import Console
 from rich.table import Table
 
 S3_PRICING_DOLLAR_PER_GB_MONTH = 0.023
+_UNITS = ('', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi', 'Yi')
 
 
 def display_archive_items(items: List[ArchiveItem], estimate_cost: bool = False):
@@ -29,7 +30,9 @@ def display_archive_items(items: List[ArchiveItem], estimate_cost: bool = False)
         key=lambda x: x.key,
         reverse=True)
 
-    total_size = sum([_size_of(item.path) for item in items])
+    # Stat each item once, and reuse the result for both the rows and the total.
+    sizes = {item.path: _size_of(item.path) for item in items}
+    total_size = sum(sizes.values())
 
     if len(sorted_items) > max_display:
         truncated_items = len(sorted_items) - max_display
@@ -37,7 +40,7 @@ def display_archive_items(items: List[ArchiveItem], estimate_cost: bool = False)
 
     for item in sorted_items:
         sub_key = "/".join(item.key.split("/")[2:])
-        size = _size_of(item.path)
+        size = sizes[item.path]
 
         table.add_row(
             sub_key,
@@ -61,15 +64,18 @@ def display_archive_items(items: List[ArchiveItem], estimate_cost: bool = False)
 
 
 def _size_of(path: str):
-    path = Path(path)
-    if path.is_file():
-        return path.stat().st_size
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return 0
+    if stat.S_ISREG(file_stat.st_mode):
+        return file_stat.st_size
     return 0
 
 
 def _human_readable_bytes(num: int, suffix='B'):
-    for unit in ['', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi']:
-        if abs(num) < 1024.0:
-            return "%3.1f%s%s" % (num, unit, suffix)
-        num /= 1024.0
-    return "%.1f%s%s" % (num, 'Yi', suffix)
+    # Each unit is 2^10 times the last, so the bit length gives the unit directly.
+    if num <= 0:
+        return f"0.0{suffix}"
+    unit_index = min((num.bit_length() - 1) // 10, len(_UNITS) - 1)
+    return f"{num / (1 << (unit_index * 10)):3.1f}{_UNITS[unit_index]}{suffix}"
@@ -1,6 +1,6 @@
 import os
-from pathlib import Path
-from typing import Dict, List
+from operator import attrgetter
+from typing import List
 
 from rich import box
 
@@ -8,8 +8,10 @@ from .archive_path import ArchivePath
 from rich.console import Console
 from rich.table import Table
 
+_UNITS = ('', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi', 'Yi')
 
-def display_paths(root_path: str, paths: Dict[str, ArchivePath]):
+
+def display_paths(root_path: str, paths: List[ArchivePath]):
     # Print in terminal the files we're about to archive.
     console = Console()
     abs_path = os.path.abspath(root_path)
@@ -20,15 +22,15 @@ def display_paths(root_path: str, paths: Dict[str, ArchivePath]):
     table.add_column("Archive", justify="right")
     root_path_len = len(root_path) + 1
 
+    # Archivable and stalest paths first, with ignored paths last. Sorting is
+    # stable, so two passes with C-level key functions give the same order.
     sorted_paths: List[ArchivePath] = sorted(
-        paths.values(),
-        key=lambda x: (not x.ignored, x.should_archive, x.days_since_access),
+        paths,
+        key=attrgetter("should_archive", "days_since_access"),
         reverse=True)
+    sorted_paths.sort(key=attrgetter("ignored"))
 
     for item in sorted_paths:
-        if not item.is_root:
-            continue
-
         sub_path = item.key[root_path_len:]
 
         color = "default"
@@ -39,28 +41,20 @@ def display_paths(root_path: str, paths: Dict[str, ArchivePath]):
 
         will_archive = "YES" if item.should_archive else "NO"
 
-        path = Path(item.key)
-        size = sum(f.stat().st_size for f in path.glob('**/*') if f.is_file())
-        if path.is_file():
-            size += path.stat().st_size
-
         table.add_row(
-            _with_color(sub_path, color),
-            _with_color(str(item.days_since_access), color),
-            _with_color(_human_readable_bytes(size), color),
-            _with_color(will_archive, color)
+            sub_path,
+            str(item.days_since_access) if not item.ignored else "-",
+            _human_readable_bytes(item.size) if item.size is not None else "-",
+            will_archive,
+            style=color
         )
 
     console.print(table)
 
 
-def _with_color(x: str, color: str):
-    return f"[{color}]{x}[/{color}]"
-
-
 def _human_readable_bytes(num: int, suffix='B'):
-    for unit in ['', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi']:
-        if abs(num) < 1024.0:
-            return "%3.1f%s%s" % (num, unit, suffix)
-        num /= 1024.0
-    return "%.1f%s%s" % (num, 'Yi', suffix)
\ No newline at end of file
+    # Each unit is 2^10 times the last, so the bit length gives the unit directly.
+    if num <= 0:
+        return f"0.0{suffix}"
+    unit_index = min((num.bit_length() - 1) // 10, len(_UNITS) - 1)
+    return f"{num / (1 << (unit_index * 10)):3.1f}{_UNITS[unit_index]}{suffix}"
@@ -0,0 +1,7 @@
+from typing import NamedTuple
+
+
+class FileEntry(NamedTuple):
+    # A single file to be archived, with the access time found while scanning.
+    path: str
+    atime_ns: int
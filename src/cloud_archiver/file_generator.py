@@ -1,43 +1,79 @@
 import os
-import uuid
-from datetime import timedelta, datetime
+import time
+from typing import FrozenSet, List, Tuple
 
+from .analyze_directory import NS_PER_DAY
+
+TEST_FILE_CONTENT = b"Random text file created for testing."
+
+# Setting the times through the open file saves resolving the path again.
+_SUPPORTS_FD_UTIME = os.utime in os.supports_fd
+
+
+def generate_test_set(path: str) -> FrozenSet[str]:
+    # Returns the files (relative to path) that should be archived at a 1 day threshold.
+    # Date every file relative to the same moment.
+    now_ns = time.time_ns()
+
+    # Create only the deepest directories; makedirs creates their parents too.
+    test_dir_1 = os.path.join(path, "test_dir_1")
+    nested_dir_1 = os.path.join(path, "test_dir_2", "nested_dir_1")
+    test_dir_3 = os.path.join(path, ".archive")
+    for leaf_dir in (test_dir_1, nested_dir_1, test_dir_3):
+        os.makedirs(leaf_dir, exist_ok=True)
 
-def generate_test_set(path: str):
     # Generate some files in the base directory.
-    generate_test_files(5, path, days_old=0)
-    generate_test_files(5, path, days_old=180)
+    generate_test_files(5, path, days_old=0, now_ns=now_ns)
+    old_root_files = generate_test_files(5, path, days_old=180, now_ns=now_ns)
 
     # Generate a directory with some files.
     # This should NOT be archived.
-    test_dir_1 = generate_directory(path, "test_dir_1")
-    generate_test_files(4, test_dir_1, days_old=0)
-    generate_test_files(1, test_dir_1, days_old=180)  # Even though these are old, the folder was touched recently.
+    generate_test_files(4, test_dir_1, days_old=0, now_ns=now_ns)
+    # Even though these are old, the folder was touched recently.
+    generate_test_files(1, test_dir_1, days_old=180, now_ns=now_ns)
 
     # Generate a directory. This one has no files, but has a nested dir with some old files.
     # These should be archived.
-    test_dir_2 = generate_directory(path, "test_dir_2")
-    nested_dir_1 = generate_directory(test_dir_2, "nested_dir_1")
-    generate_test_files(2, nested_dir_1, days_old=180)
+    old_nested_files = generate_test_files(2, nested_dir_1, days_old=180, now_ns=now_ns)
+    # Hidden files inside a folder still move along with the rest of it.
+    old_nested_files += generate_test_files(
+        1, nested_dir_1, days_old=180, now_ns=now_ns, prefix=".file"
+    )
 
     # Hidden directory --- should ignore?
-    test_dir_3 = generate_directory(path, ".archive")
-    generate_test_files(2, test_dir_3, days_old=6)
+    generate_test_files(2, test_dir_3, days_old=6, now_ns=now_ns)
 
+    return frozenset(os.path.relpath(x, path) for x in old_root_files + old_nested_files)
 
-def generate_directory(root_path: str, directory_name: str):
-    directory_path = os.path.join(root_path, directory_name)
-    os.makedirs(directory_path, exist_ok=True)
-    return directory_path
 
+def generate_test_files(
+    n: int, root_path: str, days_old: int = 0, now_ns: int = None, prefix: str = "file"
+) -> List[str]:
+    if now_ns is None:
+        now_ns = time.time_ns()
+    edit_time_ns = now_ns - days_old * NS_PER_DAY
+    times_ns = (edit_time_ns, edit_time_ns)
+    file_paths = []
 
-def generate_test_files(n: int, root_path: str, days_old: int = 0):
-
+    # Write every file separately (rather than hard linking them), so that reading
+    # one only changes the access time of that file.
     for _ in range(n):
-        unique_id = uuid.uuid4().hex[:5]
-        random_name = f"file_{unique_id}_{days_old}d.txt"
+        unique_id = os.urandom(3).hex()[:5]
+        random_name = f"{prefix}_{unique_id}_{days_old}d.txt"
         file_path = os.path.join(root_path, random_name)
-        with open(file_path, "w") as f:
-            f.write("Random text file created for testing.")
-        edit_date = datetime.now() - timedelta(days=days_old)
-        os.utime(file_path, (edit_date.timestamp(), edit_date.timestamp()))
+        _write_test_file(file_path, times_ns)
+        file_paths.append(file_path)
+
+    return file_paths
+
+
+def _write_test_file(file_path: str, times_ns: Tuple[int, int]):
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, TEST_FILE_CONTENT)
+        if _SUPPORTS_FD_UTIME:
+            os.utime(fd, ns=times_ns)
+    finally:
+        os.close(fd)
+    if not _SUPPORTS_FD_UTIME:
+        os.utime(file_path, ns=times_ns)
@@ -10,18 +10,21 @@ def get_items_in_archive(root_dir: str, archive_folder: str) -> List[ArchiveItem
     archive_path = os.path.join(root_dir, archive_folder)
     items = []
 
-    # No items to archive.
-    if not os.path.exists(archive_path):
-        return items
-
+    # Walk with an explicit stack of scandir calls; each entry's path already
+    # includes the archive path, so the key is just the rest of it.
     root_length = len(archive_path) + 1
-    for walk_root, walk_dirs, files in os.walk(archive_path):
-        root_head = walk_root[root_length:]
-
-        # For each file, also get the path and restore the key.
-        for walk_file in files:
-            key = os.path.join(root_head, walk_file)
-            file_path = os.path.join(walk_root, walk_file)
-            items.append(ArchiveItem(key, file_path))
+    stack = [archive_path]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except FileNotFoundError:
+            # No items to archive.
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    items.append(ArchiveItem(entry.path[root_length:], entry.path))
 
     return items
@@ -8,14 +8,17 @@ from rich.prompt import Prompt
 from rich.console import Console
 from rich.table import Table
 
+from .upload_archive import MAX_UPLOAD_WORKERS
 
-def load_config(config_path: str) -> (str, int):
+
+def load_config(config_path: str) -> (str, int, int):
     console = Console()
 
-    if os.path.exists(config_path):
+    # Just try to open the config, rather than checking that it exists first.
+    try:
         with open(config_path, "r") as f:
             config = json.load(f)
-    else:
+    except FileNotFoundError:
         console.print(f"Config file not found at [green]{os.path.join(os.getcwd(), config_path)}[/green].")
         unique_id = uuid.uuid4().hex[:12]
         default_bucket_name = os.path.basename(os.getcwd())
@@ -35,6 +38,15 @@ def load_config(config_path: str) -> (str, int):
         with open(config_path, "w") as f:
             json.dump(config, f, indent=2)
 
+    # Optional: how many files to upload at once.
+    concurrency = config.get("concurrency", MAX_UPLOAD_WORKERS)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        console.print(
+            f"[red]Invalid concurrency {concurrency!r} in {config_path}[/red] "
+            f"(it should be a whole number of at least 1). Using {MAX_UPLOAD_WORKERS} instead."
+        )
+        concurrency = MAX_UPLOAD_WORKERS
+
     my_session = boto3.session.Session()
     region = my_session.region_name
     profile = my_session.profile_name
@@ -42,8 +54,9 @@ def load_config(config_path: str) -> (str, int):
     table = Table(show_header=False, box=box.MINIMAL)
     table.add_row("[green]Bucket", config["bucket"])
     table.add_row("[green]Days", str(config["days"]))
+    table.add_row("[green]Concurrency", str(concurrency))
     table.add_row("[green]AWS Profile", str(profile))
     table.add_row("[green]AWS Region", str(region))
     console.print(table)
 
-    return config["bucket"], config["days"]
+    return config["bucket"], config["days"], concurrency
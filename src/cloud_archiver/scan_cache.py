@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# The cache can hold an entry for every directory in the tree, so use orjson
+# (much faster to parse and write) if it's installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# How long a cached directory listing is kept for. Reading a file changes its
+# access time without touching its directory, so cached access times can be out
+# of date: they're only used to rule roots out of archiving (see analyze_directory),
+# and expire so the cache doesn't drift too far from the disk.
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Bump this whenever the layout of the cached entries changes.
+CACHE_VERSION = 1
+
+
+class ScanCache:
+    # Remembers the (name, atime_ns, size) of the files in each scanned directory,
+    # keyed by the directory's mtime, so that an unchanged directory can be
+    # validated with a single stat instead of re-stat'ing all of its files.
+
+    def __init__(self, entries: Dict[str, dict] = None, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.ttl_seconds: float = ttl_seconds
+        self._entries: Dict[str, dict] = entries if entries is not None else {}
+        self.seen_entries: Dict[str, dict] = {}
+        # Root subtrees are scanned on several threads at once.
+        self._lock = threading.Lock()
+
+    def lookup(self, dir_path: str, mtime_ns: int) -> Optional[List[Tuple[str, int, int]]]:
+        entry = self._entries.get(dir_path)
+        if entry is None or entry["mtime_ns"] != mtime_ns:
+            return None
+        if time.time() - entry["scanned"] > self.ttl_seconds:
+            return None
+
+        with self._lock:
+            self.seen_entries[dir_path] = entry
+        return [tuple(x) for x in entry["files"]]
+
+    def store(self, dir_path: str, mtime_ns: int, files: List[Tuple[str, int, int]]):
+        entry = {
+            "mtime_ns": mtime_ns,
+            "scanned": time.time(),
+            "files": files,
+        }
+        with self._lock:
+            self.seen_entries[dir_path] = entry
+
+    def refreshing(self) -> "ScanCache":
+        # A view of this cache which never returns cached stats, but still records
+        # the fresh ones, so that they're saved for the next run.
+        view = ScanCache(ttl_seconds=self.ttl_seconds)
+        view.seen_entries = self.seen_entries
+        view._lock = self._lock
+        return view
+
+    def __repr__(self):
+        return f"[ScanCache: {len(self._entries)} entries ttl={self.ttl_seconds}]"
+
+
+def load_scan_cache(cache_path: str, ttl_seconds: float = CACHE_TTL_SECONDS) -> ScanCache:
+    # A missing or unreadable cache just means everything gets scanned.
+    try:
+        with open(cache_path, "rb") as f:
+            cache_data = _loads(f.read())
+        entries = cache_data["directories"] if cache_data.get("version") == CACHE_VERSION else {}
+    except (OSError, ValueError, AttributeError, KeyError):
+        entries = {}
+
+    return ScanCache(entries, ttl_seconds)
+
+
+def save_scan_cache(cache_path: str, cache: ScanCache):
+    # Only keep the directories seen in this scan, so deleted ones drop out.
+    try:
+        with open(cache_path, "wb") as f:
+            f.write(_dumps({"version": CACHE_VERSION, "directories": cache.seen_entries}))
+    except OSError:
+        pass
+
+
+def _loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
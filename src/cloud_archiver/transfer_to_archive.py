@@ -1,14 +1,14 @@
+import errno
 import os
 import shutil
-import stat
 from datetime import datetime
-from typing import Dict
+from typing import List
 from rich.console import Console
 
-from .archive_path import ArchivePath
+from .file_entry import FileEntry
 
 
-def transfer_to_archive(paths: Dict[str, ArchivePath], root_dir: str, archive_dir: str):
+def transfer_to_archive(files: List[FileEntry], root_dir: str, archive_dir: str):
     console = Console()
 
     # Ensure that the archive folder exists.
@@ -17,22 +17,29 @@ def transfer_to_archive(paths: Dict[str, ArchivePath], root_dir: str, archive_di
     console.print(f"Archive directory created at [green]{archive_path}[/green].")
     archive_items = []
     n = 0
-
-    for path in paths.values():
-        if not path.should_archive or path.is_dir:
-            continue
-
-        archive_key = _create_archive_key(path.key)
-        archive_key_path = os.path.join(archive_key, path.key)
-        archive_file_path = os.path.join(archive_path, archive_key_path)
+    created_dirs = set()
+    # Keys only depend on the month, so lots of files share just a few of them.
+    archive_keys = {}
+    archive_base = archive_path + os.sep
+
+    for file in files:
+        access_date = datetime.fromtimestamp(file.atime_ns / 10 ** 9)
+        year_month = (access_date.year, access_date.month)
+        archive_key = archive_keys.get(year_month)
+        if archive_key is None:
+            archive_key = archive_keys[year_month] = _create_archive_key(*year_month)
+        archive_key_path = archive_key + os.sep + file.path
+        archive_file_path = archive_base + archive_key_path
 
         archive_file_dir = os.path.dirname(archive_file_path)
-        os.makedirs(archive_file_dir, exist_ok=True)
+        if archive_file_dir not in created_dirs:
+            os.makedirs(archive_file_dir, exist_ok=True)
+            created_dirs.add(archive_file_dir)
 
         console.print(
-            f"Moving [yellow]{path.key}[/yellow] to [blue]{archive_file_path}[/blue]."
+            f"Moving [yellow]{file.path}[/yellow] to [blue]{archive_file_path}[/blue]."
         )
-        shutil.move(path.key, archive_file_path)
+        _move(file.path, archive_file_path)
         archive_items.append((archive_key_path, archive_file_path))
         n += 1
 
@@ -40,9 +47,17 @@ def transfer_to_archive(paths: Dict[str, ArchivePath], root_dir: str, archive_di
     return archive_items
 
 
-def _create_archive_key(path: str):
-    file_stats_result = os.stat(path)
-    access_time = file_stats_result[stat.ST_ATIME]
-    access_date = datetime.fromtimestamp(access_time)
-    key = os.path.join(str(access_date.year), str(access_date.month).zfill(2))
+def _move(source: str, destination: str):
+    # Within one filesystem a move is just a rename, so skip shutil.move's checks,
+    # and only fall back to it (copy + delete) when crossing devices.
+    try:
+        os.rename(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, destination)
+
+
+def _create_archive_key(year: int, month: int):
+    key = os.path.join(str(year), str(month).zfill(2))
     return key
\ No newline at end of file
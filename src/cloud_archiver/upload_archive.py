@@ -1,26 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List
 
+from boto3.s3.transfer import TransferConfig
 from botocore.client import BaseClient
+from botocore.exceptions import ClientError
 from rich.progress import Progress
 from rich.console import Console
 
 from.archive_item import ArchiveItem
 
+# Uploads are bound by network round-trips, so run several at once.
+MAX_UPLOAD_WORKERS = 16
 
-def upload(s3_client: BaseClient, bucket_name: str, archive_items: List[ArchiveItem]):
+# Large files are also split into parts and uploaded in parallel. Bigger parts
+# mean fewer requests (each with its own fixed overhead) per file.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+
+def upload(
+    s3_client: BaseClient,
+    bucket_name: str,
+    archive_items: List[ArchiveItem],
+    max_workers: int = MAX_UPLOAD_WORKERS,
+):
 
     # Upload everything under archive_path to S3.
-    s3_client.create_bucket(Bucket=bucket_name)
     console = Console()
 
     try:
-        with Progress() as progress:
+        _ensure_bucket(s3_client, bucket_name)
+        with Progress() as progress, ThreadPoolExecutor(max_workers=max_workers) as executor:
             task = progress.add_task("[green]Upload", total=len(archive_items))
-            for item in archive_items:
-                s3_client.upload_file(item.path, bucket_name, item.key)
-                progress.update(task, advance=1)
+            futures = [
+                executor.submit(
+                    s3_client.upload_file, item.path, bucket_name, item.key, Config=TRANSFER_CONFIG
+                )
+                for item in archive_items
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    progress.update(task, advance=1)
+            except BaseException:
+                # Don't start any uploads still waiting in the queue, including on
+                # Ctrl-C; otherwise leaving the executor would wait for all of them.
+                for future in futures:
+                    future.cancel()
+                raise
         console.print(f"Uploaded {len(archive_items)} files to [green]{bucket_name}[/green].")
         return True
     except Exception as e:
         console.log(f"ERROR: Failed uploading to S3: {e}")
         return False
+
+
+def _ensure_bucket(s3_client: BaseClient, bucket_name: str):
+    # Checking for the bucket is cheaper than re-creating it on every upload.
+    try:
+        s3_client.head_bucket(Bucket=bucket_name)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchBucket"):
+            raise
+        s3_client.create_bucket(Bucket=bucket_name)
@@ -0,0 +1,40 @@
+import os
+import shutil
+
+import pytest
+
+from src.cloud_archiver.file_generator import generate_test_set
+
+
+@pytest.fixture(scope="session")
+def sample_data_template(tmp_path_factory):
+    # Generate the sample tree only once per session.
+    template_path = tmp_path_factory.mktemp("sample_data")
+    expected_archive_files = generate_test_set(str(template_path))
+    return template_path, expected_archive_files
+
+
+@pytest.fixture
+def sample_data_path(sample_data_template, tmp_path, monkeypatch):
+    # Give every test its own copy of the sample tree, since most of them move files
+    # out of it. Hard link the files rather than copying them: reading a file to copy
+    # it could bump its access time, and the tests depend on those.
+    # Run from tmp_path so the scanned paths stay relative, as they are in the app.
+    template_path, _ = sample_data_template
+    monkeypatch.chdir(tmp_path)
+    shutil.copytree(template_path, "sample_data", copy_function=os.link)
+    return "sample_data"
+
+
+@pytest.fixture
+def expected_archive_files(sample_data_template, sample_data_path):
+    # The paths that analyzing sample_data_path (at a 1 day threshold) should pick.
+    _, expected_archive_files = sample_data_template
+    return frozenset(os.path.join(sample_data_path, x) for x in expected_archive_files)
+
+
+@pytest.fixture
+def archive_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("archive")
+    return "archive"
@@ -1,81 +1,336 @@
-import time
+import json
 import os
-import shutil
-from unittest.mock import Mock
+import time
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
 
+from src.cloud_archiver import analyze_directory as analyze_directory_module
 from src.cloud_archiver.analyze_directory import analyze_directory
+from src.cloud_archiver.archive_item import ArchiveItem
+from src.cloud_archiver.cloud_archiver import _get_s3_client
+from src.cloud_archiver.delete_archive_items import delete_archive_items
 from src.cloud_archiver.display_archive_items import display_archive_items
 from src.cloud_archiver.display_paths import display_paths
-from src.cloud_archiver.file_generator import generate_test_set
+from src.cloud_archiver.file_generator import generate_test_files
 from src.cloud_archiver.get_items_in_archive import get_items_in_archive
+from src.cloud_archiver.load_config import load_config
+from src.cloud_archiver.scan_cache import ScanCache, load_scan_cache, save_scan_cache
 from src.cloud_archiver.transfer_to_archive import transfer_to_archive
-from src.cloud_archiver.upload_archive import upload
+from src.cloud_archiver.upload_archive import MAX_UPLOAD_WORKERS, TRANSFER_CONFIG, upload
 
-OUTPUT_PATH = "test_output"
-SAMPLE_DATA_PATH = os.path.join(OUTPUT_PATH, "sample_data")
-ARCHIVE_PATH = os.path.join(OUTPUT_PATH, "archive")
 ARCHIVE_FOLDER = ".archive"
+CACHE_FILE = "archive_cache.json"
 IGNORE_PATHS = [ARCHIVE_FOLDER]
 
 
-def setup():
-    os.makedirs(OUTPUT_PATH, exist_ok=True)
-    os.makedirs(SAMPLE_DATA_PATH, exist_ok=True)
-    os.makedirs(ARCHIVE_PATH, exist_ok=True)
+@pytest.mark.parametrize("n_files, days_old", [(1, 0), (3, 1), (5, 180)])
+def test_generate_test_files(tmp_path, n_files, days_old):
+    file_paths = generate_test_files(n_files, str(tmp_path), days_old=days_old)
+    assert sorted(file_paths) == sorted(str(x) for x in tmp_path.iterdir())
 
+    # Each file is separate, so reading one doesn't change the access time of the others.
+    assert all(os.stat(x).st_nlink == 1 for x in file_paths)
 
-def teardown():
-    shutil.rmtree(OUTPUT_PATH)
+    # Every file should be just as old as asked for.
+    roots, files = analyze_directory(str(tmp_path), [], threshold_days=1)
+    assert all(x.days_since_access == days_old for x in roots)
+    assert len(files) == (n_files if days_old >= 1 else 0)
 
 
-def test_traverse():
+def test_traverse(sample_data_path, expected_archive_files):
     # Test that we can fully traverse the directory and figure out the timestamp of each root node.
-    generate_test_set(SAMPLE_DATA_PATH)
+    roots, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+
+    # Print the result.
+    display_paths(sample_data_path, roots)
+    assert len(roots) == len(os.listdir(sample_data_path))  # Every top level entry is a root.
+    assert frozenset(x.path for x in files) == expected_archive_files
+
+    # Including the hidden files inside archived folders (they're never split up).
+    assert any(os.path.basename(x.path).startswith(".") for x in files)
+
+
+def test_hidden_files_keep_folders_from_archiving(tmp_path):
+    # A recently used hidden file still counts as using its folder.
+    project_path = os.path.join(str(tmp_path), "project")
+    os.makedirs(project_path)
+    generate_test_files(1, project_path, days_old=100)
+    generate_test_files(1, project_path, days_old=0, prefix=".env")
+
+    roots, files = analyze_directory(str(tmp_path), [], threshold_days=60)
+    assert files == []
+    assert not roots[0].should_archive
+
+
+def test_traverse_skips_ignored_roots(sample_data_path, expected_archive_files, monkeypatch):
+    # Ignored roots can never be archived, so they shouldn't be walked at all.
+    scanned_paths = []
+    real_scan_subtree = analyze_directory_module._scan_subtree
+
+    def recording_scan_subtree(entry, *args, **kwargs):
+        scanned_paths.append(entry.path)
+        return real_scan_subtree(entry, *args, **kwargs)
+
+    monkeypatch.setattr(analyze_directory_module, "_scan_subtree", recording_scan_subtree)
+    roots, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+
+    ignored_path = os.path.join(sample_data_path, ARCHIVE_FOLDER)
+    assert ignored_path not in scanned_paths
+    assert len(scanned_paths) == len(roots) - 1
+    [ignored_root] = [x for x in roots if x.ignored]
+    assert ignored_root.key == ignored_path and ignored_root.size is None
+    assert frozenset(x.path for x in files) == expected_archive_files
+
+
+@pytest.mark.parametrize("use_fwalk", [True, False])
+def test_traverse_skips_directory_links(tmp_path, monkeypatch, use_fwalk):
+    # Both ways of walking should treat a link to a directory the same: never follow
+    # it, and never archive it as if it were a file.
+    if use_fwalk and not analyze_directory_module._SUPPORTS_FWALK:
+        pytest.skip("os.fwalk isn't supported here.")
+    monkeypatch.setattr(analyze_directory_module, "_SUPPORTS_FWALK", use_fwalk)
+
+    root_path = str(tmp_path / "root")
+    project_path = os.path.join(root_path, "project")
+    linked_path = str(tmp_path / "linked")
+    os.makedirs(project_path)
+    os.makedirs(linked_path)
+    file_paths = generate_test_files(1, project_path, days_old=100)
+    generate_test_files(1, linked_path, days_old=100)
+    os.symlink(linked_path, os.path.join(project_path, "dir_link"), target_is_directory=True)
 
-    result = analyze_directory(SAMPLE_DATA_PATH, IGNORE_PATHS, threshold_days=1)
-    n_root_paths = sum([1 for _, x in result.items() if x.is_root])
-    n_archive_files = sum(
-        [1 for _, x in result.items() if x.should_archive and not x.is_dir]
+    _, files = analyze_directory(root_path, [], threshold_days=60)
+    assert [x.path for x in files] == file_paths
+
+
+def test_traverse_with_cache(sample_data_path):
+    # A cached scan should give the same result as a fresh one.
+    cache = load_scan_cache(CACHE_FILE)
+    fresh_roots, fresh_files = analyze_directory(
+        sample_data_path, IGNORE_PATHS, threshold_days=1, cache=cache
     )
+    save_scan_cache(CACHE_FILE, cache)
 
-    # Print the result.
-    display_paths(SAMPLE_DATA_PATH, result)
-    assert n_root_paths == 13  # Expect 12 root paths.
-    assert n_archive_files == 7  # Expect these many files to be archived.
+    cache = load_scan_cache(CACHE_FILE)
+    cached_roots, cached_files = analyze_directory(
+        sample_data_path, IGNORE_PATHS, threshold_days=1, cache=cache
+    )
+    assert len(cache.seen_entries) > 0
+
+    cached_map = {x.key: x for x in cached_roots}
+    for path in fresh_roots:
+        assert cached_map[path.key].days_since_access == path.days_since_access
+        assert cached_map[path.key].should_archive == path.should_archive
+        assert cached_map[path.key].size == path.size
+    assert sorted(cached_files) == sorted(fresh_files)
+
+
+def test_cache_ignores_recently_read_files(tmp_path):
+    # Reading a file doesn't change its directory's mtime, so the cache still has
+    # its old access time. That must never be enough to archive it.
+    root_path = str(tmp_path / "root")
+    project_path = os.path.join(root_path, "project")
+    cache_path = str(tmp_path / CACHE_FILE)
+    os.makedirs(project_path)
+    file_paths = generate_test_files(1, project_path, days_old=100)
+
+    cache = load_scan_cache(cache_path)
+    _, files = analyze_directory(root_path, [], threshold_days=60, cache=cache)
+    save_scan_cache(cache_path, cache)
+    assert [x.path for x in files] == file_paths
+
+    dir_mtime_ns = os.stat(project_path).st_mtime_ns
+    os.utime(file_paths[0], ns=(time.time_ns(), os.stat(file_paths[0]).st_mtime_ns))
+    assert os.stat(project_path).st_mtime_ns == dir_mtime_ns
+
+    cache = load_scan_cache(cache_path)
+    roots, files = analyze_directory(root_path, [], threshold_days=60, cache=cache)
+    assert files == []
+    assert roots[0].days_since_access == 0
+    assert not roots[0].should_archive
+
+
+def test_cache_rescans_changed_directories(tmp_path):
+    # Once the only recent file is deleted, the folder should be archivable again.
+    root_path = str(tmp_path / "root")
+    project_path = os.path.join(root_path, "project")
+    cache_path = str(tmp_path / CACHE_FILE)
+    os.makedirs(project_path)
+    old_files = generate_test_files(1, project_path, days_old=100)
+    recent_files = generate_test_files(1, project_path, days_old=0)
+
+    cache = load_scan_cache(cache_path)
+    _, files = analyze_directory(root_path, [], threshold_days=60, cache=cache)
+    save_scan_cache(cache_path, cache)
+    assert files == []
+
+    # Make sure the mtime moves on, even on filesystems with coarse timestamps.
+    dir_stat = os.stat(project_path)
+    os.remove(recent_files[0])
+    os.utime(project_path, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns + 10 ** 9))
+
+    cache = load_scan_cache(cache_path)
+    roots, files = analyze_directory(root_path, [], threshold_days=60, cache=cache)
+    assert [x.path for x in files] == old_files
+    assert roots[0].should_archive
+
+
+def test_cache_rechecks_only_cached_roots(tmp_path, monkeypatch):
+    # Roots scanned from the disk are trusted as they are; only roots that look
+    # archivable from cached listings need scanning again.
+    if not analyze_directory_module._SUPPORTS_FWALK:
+        pytest.skip("Stats are only counted through os.stat with os.fwalk.")
+    root_path = str(tmp_path / "root")
+    cache_path = str(tmp_path / CACHE_FILE)
+    for i in range(3):
+        os.makedirs(os.path.join(root_path, f"project_{i}"))
+        generate_test_files(10, os.path.join(root_path, f"project_{i}"), days_old=100)
 
+    n_stats = 0
+    real_stat = os.stat
 
-def test_archive():
-    generate_test_set(SAMPLE_DATA_PATH)
+    def counting_stat(*args, **kwargs):
+        nonlocal n_stats
+        n_stats += 1
+        return real_stat(*args, **kwargs)
 
-    result = analyze_directory(SAMPLE_DATA_PATH, IGNORE_PATHS, threshold_days=1)
-    items = transfer_to_archive(result, ARCHIVE_PATH, ARCHIVE_FOLDER)
-    assert len(items) == 7  # Expect these many files to be archived.
+    def count_stats(cache):
+        nonlocal n_stats
+        n_stats = 0
+        monkeypatch.setattr(os, "stat", counting_stat)
+        _, files = analyze_directory(root_path, [], threshold_days=60, cache=cache)
+        monkeypatch.setattr(os, "stat", real_stat)
+        assert len(files) == 30
+        return n_stats
 
+    n_uncached_stats = count_stats(None)
 
-def test_upload():
-    def fake_upload(path, bucket, key):
+    # A cold cache has no hits, so there's nothing to check again.
+    cache = load_scan_cache(cache_path)
+    assert count_stats(cache) == n_uncached_stats
+    save_scan_cache(cache_path, cache)
+
+    # A warm cache hits for every root, and they all look archivable, so each
+    # one is scanned again (but its files are only stat'ed that one time).
+    assert count_stats(load_scan_cache(cache_path)) < 2 * n_uncached_stats
+
+
+def test_cache_entries_expire():
+    def make_cache(ttl_seconds):
+        entry = {"mtime_ns": 1, "scanned": time.time() - 60, "files": [["a.txt", 2, 3]]}
+        return ScanCache({"dir": entry}, ttl_seconds=ttl_seconds)
+
+    assert make_cache(ttl_seconds=120).lookup("dir", 1) == [("a.txt", 2, 3)]
+    assert make_cache(ttl_seconds=30).lookup("dir", 1) is None
+    assert make_cache(ttl_seconds=120).lookup("dir", 2) is None
+
+
+def test_archive(sample_data_path, archive_path, expected_archive_files):
+    _, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+    items = transfer_to_archive(files, archive_path, ARCHIVE_FOLDER)
+
+    # Archive keys are the original path under a year/month prefix.
+    assert frozenset(key.split(os.sep, 2)[2] for key, _ in items) == expected_archive_files
+
+
+def test_upload(sample_data_path, archive_path):
+    uploaded_keys = []
+
+    def fake_upload(path, bucket, key, **kwargs):
         print(f"Uploading [{path}, {bucket}, {key}]")
-        time.sleep(0.2)
+        uploaded_keys.append(key)
 
-    mock_s3_client = Mock()
-    mock_s3_client.create_bucket = Mock()
-    mock_s3_client.upload_file = Mock(side_effect=fake_upload)
+    # No call recording needed, so a plain namespace is enough for a client.
+    mock_s3_client = SimpleNamespace(
+        head_bucket=lambda **kwargs: None,
+        create_bucket=lambda **kwargs: None,
+        upload_file=fake_upload,
+    )
 
     bucket = "archive.bucket"
-    generate_test_set(SAMPLE_DATA_PATH)
+    _, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+    transfer_to_archive(files, archive_path, ARCHIVE_FOLDER)
+    items = get_items_in_archive(archive_path, ARCHIVE_FOLDER)
+    assert upload(mock_s3_client, bucket, items)
+    assert sorted(uploaded_keys) == sorted(item.key for item in items)
 
-    result = analyze_directory(SAMPLE_DATA_PATH, IGNORE_PATHS, threshold_days=1)
-    items = transfer_to_archive(result, ARCHIVE_PATH, ARCHIVE_FOLDER)
-    upload(mock_s3_client, bucket, items)
 
+@pytest.mark.parametrize("error_code, should_succeed", [("404", True), ("403", False)])
+def test_upload_missing_bucket(sample_data_path, archive_path, error_code, should_succeed):
+    # A missing bucket should be created; any other error (e.g. no access) should fail the upload.
+    created_buckets = []
+    uploaded_keys = []
+
+    def head_bucket(Bucket):
+        raise ClientError({"Error": {"Code": error_code}}, "HeadBucket")
+
+    mock_s3_client = SimpleNamespace(
+        head_bucket=head_bucket,
+        create_bucket=lambda Bucket: created_buckets.append(Bucket),
+        upload_file=lambda path, bucket, key, **kwargs: uploaded_keys.append(key),
+    )
+
+    bucket = "archive.bucket"
+    _, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+    transfer_to_archive(files, archive_path, ARCHIVE_FOLDER)
+    items = get_items_in_archive(archive_path, ARCHIVE_FOLDER)
+    assert upload(mock_s3_client, bucket, items) == should_succeed
+    if should_succeed:
+        assert created_buckets == [bucket]
+        assert len(uploaded_keys) == len(items)
+    else:
+        assert created_buckets == []
+        assert uploaded_keys == []
 
-def test_walk_files():
-    # Once we transfer files to archives, we should be able to list them and get the keys.
-    generate_test_set(SAMPLE_DATA_PATH)
 
-    result = analyze_directory(SAMPLE_DATA_PATH, IGNORE_PATHS, threshold_days=1)
-    original_items = transfer_to_archive(result, ARCHIVE_PATH, ARCHIVE_FOLDER)
-    items = get_items_in_archive(ARCHIVE_PATH, ARCHIVE_FOLDER)
+@pytest.mark.parametrize(
+    "concurrency, expected",
+    [(8, 8), (0, MAX_UPLOAD_WORKERS), ("8", MAX_UPLOAD_WORKERS), (True, MAX_UPLOAD_WORKERS)],
+)
+def test_load_config_concurrency(tmp_path, concurrency, expected):
+    # Bad concurrency values should fall back to the default, rather than break the upload.
+    config_path = str(tmp_path / "config.json")
+    with open(config_path, "w") as f:
+        json.dump({"bucket": "archive.bucket", "days": 60, "concurrency": concurrency}, f)
+
+    assert load_config(config_path) == ("archive.bucket", 60, expected)
+
+
+def test_upload_interrupted():
+    # Interrupting the upload should stop it straight away, not after the whole queue.
+    uploaded_keys = []
+
+    def fake_upload(path, bucket, key, **kwargs):
+        if key == "0":
+            raise KeyboardInterrupt
+        time.sleep(0.01)
+        uploaded_keys.append(key)
+
+    mock_s3_client = SimpleNamespace(
+        head_bucket=lambda **kwargs: None,
+        create_bucket=lambda **kwargs: None,
+        upload_file=fake_upload,
+    )
+
+    items = [ArchiveItem(str(i), f"{i}.txt") for i in range(100)]
+    with pytest.raises(KeyboardInterrupt):
+        upload(mock_s3_client, "archive.bucket", items, max_workers=1)
+    assert len(uploaded_keys) < len(items) - 1
+
+
+def test_s3_client_connection_pool():
+    # There should be a connection for every part that can be uploading at once.
+    client = _get_s3_client(8)
+    assert client.meta.config.max_pool_connections == 8 * TRANSFER_CONFIG.max_concurrency
+
+
+def test_walk_files(sample_data_path, archive_path):
+    # Once we transfer files to archives, we should be able to list them and get the keys.
+    _, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+    original_items = transfer_to_archive(files, archive_path, ARCHIVE_FOLDER)
+    items = get_items_in_archive(archive_path, ARCHIVE_FOLDER)
 
     # Test we get the same number of files.
     assert len(original_items) == len(items)
@@ -87,11 +342,20 @@ def test_walk_files():
         assert original_map[item.key] == item.path
 
 
-def test_display_items():
+def test_display_items(sample_data_path, archive_path):
     # Once we transfer files to archives, we should be able to list them and get the keys.
-    generate_test_set(SAMPLE_DATA_PATH)
-
-    result = analyze_directory(SAMPLE_DATA_PATH, IGNORE_PATHS, threshold_days=1)
-    transfer_to_archive(result, ARCHIVE_PATH, ARCHIVE_FOLDER)
-    items = get_items_in_archive(ARCHIVE_PATH, ARCHIVE_FOLDER)
+    _, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+    transfer_to_archive(files, archive_path, ARCHIVE_FOLDER)
+    items = get_items_in_archive(archive_path, ARCHIVE_FOLDER)
     display_archive_items(items, estimate_cost=True)
+
+
+def test_delete_items(sample_data_path, archive_path):
+    # Deleting the archived items should leave an empty archive folder behind.
+    _, files = analyze_directory(sample_data_path, IGNORE_PATHS, threshold_days=1)
+    transfer_to_archive(files, archive_path, ARCHIVE_FOLDER)
+    items = get_items_in_archive(archive_path, ARCHIVE_FOLDER)
+    n_deleted = delete_archive_items(items, os.path.join(archive_path, ARCHIVE_FOLDER))
+
+    assert n_deleted == len(items)
+    assert os.listdir(os.path.join(archive_path, ARCHIVE_FOLDER)) == []